@@ -31,14 +31,15 @@ from .session import (
     export_session_to_file,
     export_session_to_json,
     export_session_to_markdown,
+    export_session_to_markdown_stream,
     generate_session_id,
     generate_user_id,
     list_sessions,
     load_session,
     save_session,
 )
-from .tools import BaseTool, ToolRegistry, ToolStreamProcessor, format_tool_result
-from .types import Message, ToolDefinition, ToolResult
+from .tools import BaseTool, ToolRegistry, ToolStreamProcessor, format_tool_result, format_tool_results
+from .types import Message, ToolDefinition, ToolResult, ToolResultBlockObj, ToolUseBlockObj
 
 __all__ = [
     "AuthConfig",
@@ -74,7 +75,9 @@ __all__ = [
     "ToolDefinition",
     "ToolRegistry",
     "ToolResult",
+    "ToolResultBlockObj",
     "ToolStreamProcessor",
+    "ToolUseBlockObj",
     "add_message_to_session",
     "create_session",
     "delete_session",
@@ -84,7 +87,9 @@ __all__ = [
     "export_session_to_file",
     "export_session_to_json",
     "export_session_to_markdown",
+    "export_session_to_markdown_stream",
     "format_tool_result",
+    "format_tool_results",
     "generate_session_id",
     "generate_user_id",
     "init_auth",
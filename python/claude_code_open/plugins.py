@@ -6,11 +6,14 @@ import pathlib
 import sys
 from dataclasses import dataclass, field
 from types import ModuleType
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 
 from .errors import PluginError
 from .types import ToolDefinition, ToolResult
 
+# Plugin directories this module has added to sys.path, shared by every manager.
+_REGISTERED_DIRS: Set[str] = set()
+
 
 @dataclass
 class PluginMetadata:
@@ -83,8 +86,7 @@ class PluginManager:
             for path in (plugin_dirs or [pathlib.Path.home() / ".claude" / "plugins"])
         ]
         for directory in self.plugin_dirs:
-            if str(directory) not in sys.path:
-                sys.path.append(str(directory))
+            _register_plugin_dir(str(directory))
 
     def discover(self) -> List[PluginState]:
         states: List[PluginState] = []
@@ -185,6 +187,14 @@ class PluginManager:
         return pathlib.Path(state.path).name
 
 
+def _register_plugin_dir(directory: str) -> None:
+    if directory in _REGISTERED_DIRS:
+        return
+    _REGISTERED_DIRS.add(directory)
+    if directory not in sys.path:
+        sys.path.append(directory)
+
+
 class PluginToolExecutor:
     def __init__(self, manager: PluginManager) -> None:
         self.manager = manager
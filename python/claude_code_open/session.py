@@ -7,10 +7,15 @@ import secrets
 import time
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import IO, Any, Dict, Iterator, List, Optional
 
 from .types import Message
 
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
 
 SESSION_DIR = Path.home() / ".claude" / "sessions"
 MAX_SESSIONS = 100
@@ -270,27 +275,63 @@ def export_session_to_json(session: SessionData) -> str:
 def export_session_to_markdown(session: SessionData) -> str:
     lines = [f"# Session {session.metadata.name or session.metadata.id}"]
     for message in session.messages:
-        role = message.get("role", "")
-        lines.append(f"\n## {role.title()}\n")
-        content = message.get("content", "")
-        if isinstance(content, str):
-            lines.append(content)
-        else:
-            for block in content:
-                if block.get("type") == "text":
-                    lines.append(block.get("text", ""))
-                elif block.get("type") == "tool_result":
-                    lines.append(str(block.get("content", "")))
+        lines.extend(_message_markdown_lines(message))
     return "\n".join(lines)
 
 
+def export_session_to_markdown_stream(session_id: str, out: IO[str]) -> bool:
+    """Write a saved session as markdown without materializing every message.
+
+    Uses ijson when installed so only one message is resident at a time;
+    otherwise falls back to loading the session eagerly.
+    """
+    if ijson is None:
+        session = load_session(session_id)
+        if not session:
+            return False
+        out.write(export_session_to_markdown(session))
+        return True
+
+    path = get_session_path(session_id)
+    if not path.exists():
+        return False
+    try:
+        with path.open("rb") as fp:
+            metadata = next(ijson.items(fp, "metadata", use_float=True), None) or {}
+            out.write(f"# Session {metadata.get('name') or metadata.get('id', '')}")
+            fp.seek(0)
+            for message in ijson.items(fp, "messages.item", use_float=True):
+                for line in _message_markdown_lines(message):
+                    out.write("\n")
+                    out.write(line)
+    except ijson.JSONError:
+        return False
+    return True
+
+
 def export_session_to_file(session_id: str, path: str, format: str = "json") -> bool:
+    if format != "json":
+        if not get_session_path(session_id).exists():
+            return False
+        # Stream into a sibling temp file so a corrupt session never leaves a partial export behind.
+        target = Path(path)
+        tmp_path = target.with_name(f".{target.name}.{secrets.token_hex(4)}.tmp")
+        ok = False
+        try:
+            with tmp_path.open("w", encoding="utf-8") as out:
+                ok = export_session_to_markdown_stream(session_id, out)
+            if ok:
+                os.replace(tmp_path, target)
+        finally:
+            if not ok:
+                tmp_path.unlink(missing_ok=True)
+        return ok
+
     session = load_session(session_id)
     if not session:
         return False
 
-    content = export_session_to_json(session) if format == "json" else export_session_to_markdown(session)
-    Path(path).write_text(content, encoding="utf-8")
+    Path(path).write_text(export_session_to_json(session), encoding="utf-8")
     return True
 
 
@@ -496,6 +537,20 @@ class SessionManager:
             self._last_auto_save = now
 
 
+def _message_markdown_lines(message: Message) -> Iterator[str]:
+    role = message.get("role", "")
+    yield f"\n## {role.title()}\n"
+    content = message.get("content", "")
+    if isinstance(content, str):
+        yield content
+        return
+    for block in content:
+        if block.get("type") == "text":
+            yield block.get("text", "")
+        elif block.get("type") == "tool_result":
+            yield str(block.get("content", ""))
+
+
 def _timestamp_ms() -> int:
     return int(time.time() * 1000)
 
@@ -2,11 +2,43 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from dataclasses import dataclass
-from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+import sys
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, List, Optional
 
-from .types import ToolDefinition, ToolResult, ToolResultBlock, ToolUseBlock, StreamEvent
+from .types import (
+    StreamEvent,
+    ToolDefinition,
+    ToolResult,
+    ToolResultBlockObj,
+    ToolUseBlockObj,
+)
+
+try:
+    import orjson as _json  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    import json as _json
+
+try:
+    import ijson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    ijson = None
+
+_JSONError = (ValueError, _json.JSONDecodeError)
+
+_TOOL_USE_START = sys.intern("tool_use_start")
+_TOOL_USE_DELTA = sys.intern("tool_use_delta")
+
+# Sync streams yield to the event loop once every 1024 items.
+_SYNC_YIELD_MASK = 1023
+
+# Whether a stream type is async-iterable, keyed by type(stream).
+_ASYNC_TYPES: Dict[type, bool] = {}
+_ASYNC_TYPES_MAX = 256
+
+# Arguments up to this size are buffered and parsed in one go; larger ones are
+# fed to an incremental parser as they stream in (when ijson is installed).
+_INCREMENTAL_PARSE_MIN_CHARS = 4096
 
 
 PermissionBehavior = str  # 'allow' | 'deny' | 'ask'
@@ -25,9 +57,53 @@ class ToolOptions:
     base_timeout_ms: int = 120_000
 
 
+@dataclass(slots=True)
+class _PartialToolCall:
+    name: str = ""
+    input_parts: List[str] = field(default_factory=list)
+    size: int = 0
+    parser: Any = None
+    values: Any = None
+    error: Optional[Exception] = None
+
+    def feed(self, chunk: str) -> None:
+        if self.parser is not None:
+            self._send(chunk)
+            return
+        self.input_parts.append(chunk)
+        self.size += len(chunk)
+        if ijson is not None and self.size > _INCREMENTAL_PARSE_MIN_CHARS:
+            self.values = ijson.sendable_list()
+            self.parser = ijson.items_coro(self.values, "", use_float=True)
+            buffered = "".join(self.input_parts)
+            self.input_parts.clear()
+            self._send(buffered)
+
+    def parse(self) -> Any:
+        if self.parser is None:
+            return _parse_tool_input("".join(self.input_parts))
+        if self.error is None:
+            try:
+                self.parser.close()
+            except ijson.JSONError as exc:
+                self.error = exc
+        if self.error is not None:
+            raise ValueError(str(self.error).strip().splitlines()[0])
+        return self.values[0]
+
+    def _send(self, chunk: str) -> None:
+        if self.error is not None:
+            return
+        try:
+            self.parser.send(chunk.encode("utf-8"))
+        except ijson.JSONError as exc:
+            self.error = exc
+
+
 class BaseTool:
     name: str
     description: str
+    _definition_cache: Optional[ToolDefinition] = None
 
     def __init__(self, options: Optional[ToolOptions] = None) -> None:
         self.options = options or ToolOptions()
@@ -42,11 +118,17 @@ class BaseTool:
         return PermissionCheckResult(behavior="allow", updated_input=input)
 
     def get_definition(self) -> ToolDefinition:
-        return {
-            "name": self.name,
-            "description": self.description,
-            "inputSchema": self.get_input_schema(),
-        }
+        """Return a copy of the tool definition, which is built once per tool.
+
+        The nested ``inputSchema`` is shared between copies.
+        """
+        if self._definition_cache is None:
+            self._definition_cache = {
+                "name": self.name,
+                "description": self.description,
+                "inputSchema": self.get_input_schema(),
+            }
+        return dict(self._definition_cache)
 
     @staticmethod
     def success(output: str) -> ToolResult:
@@ -58,20 +140,35 @@ class BaseTool:
 
 
 class ToolRegistry:
+    """Single-writer, many-reader tool registry.
+
+    ``register`` swaps in a new ``_tools`` dict instead of mutating it, so
+    readers can iterate a snapshot without taking a lock.
+    """
+
     def __init__(self) -> None:
         self._tools: Dict[str, BaseTool] = {}
+        self._definitions_snapshot: Optional[tuple[Dict[str, BaseTool], List[ToolDefinition]]] = None
 
     def register(self, tool: BaseTool) -> None:
-        self._tools[tool.name] = tool
+        tools = dict(self._tools)
+        tools[tool.name] = tool
+        self._tools = tools
 
     def get(self, name: str) -> Optional[BaseTool]:
         return self._tools.get(name)
 
     def get_all(self) -> List[BaseTool]:
-        return list(self._tools.values())
+        tools = self._tools
+        return list(tools.values())
 
     def get_definitions(self) -> List[ToolDefinition]:
-        return [tool.get_definition() for tool in self.get_all()]
+        tools = self._tools
+        snapshot = self._definitions_snapshot
+        if snapshot is None or snapshot[0] is not tools:
+            snapshot = (tools, [tool.get_definition() for tool in tools.values()])
+            self._definitions_snapshot = snapshot
+        return [dict(definition) for definition in snapshot[1]]
 
     async def execute(
         self,
@@ -85,33 +182,144 @@ class ToolRegistry:
         if not tool:
             return {"success": False, "error": f"Tool '{name}' not found"}
 
+        check = tool.check_permissions
+        run = tool.execute
+        try:
+            perm_result = await check(input)
+        except Exception as exc:  # noqa: BLE001
+            return _format_exec_error(exc)
+
+        final_input, denied = await _resolve_permission(
+            name, input, perm_result, on_permission_request
+        )
+        if denied is not None:
+            return denied
         try:
-            perm_result = await tool.check_permissions(input)
-            if perm_result.behavior == "deny":
-                return {
-                    "success": False,
-                    "error": perm_result.message or "Permission denied by tool permission check",
-                }
-
-            if perm_result.behavior == "ask":
-                if not on_permission_request:
-                    return {
-                        "success": False,
-                        "error": perm_result.message
-                        or "Permission required but no permission handler available",
-                    }
-                approved = await on_permission_request(name, input, perm_result.message)
-                if not approved:
-                    return {"success": False, "error": "Permission denied by user"}
-
-            final_input = (
-                perm_result.updated_input
-                if perm_result.updated_input is not None
-                else input
+            return await run(final_input)
+        except Exception as exc:  # noqa: BLE001
+            return _format_exec_error(exc)
+
+    async def execute_many(
+        self,
+        calls: List[tuple[str, Dict[str, Any]]],
+        on_permission_request: Optional[
+            Callable[[str, Dict[str, Any], Optional[str]], Awaitable[bool]]
+        ] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> List[ToolResult]:
+        """Execute several ``(name, input)`` calls; results align with ``calls``.
+
+        Permission checks run concurrently, "ask" prompts are resolved one at
+        a time, then the allowed tools run concurrently (at most
+        ``max_concurrency`` at once when given).
+        """
+        results: List[Optional[ToolResult]] = [None] * len(calls)
+        pending: List[tuple[int, BaseTool]] = []
+        for index, (name, _) in enumerate(calls):
+            tool = self.get(name)
+            if tool is None:
+                results[index] = {"success": False, "error": f"Tool '{name}' not found"}
+            else:
+                pending.append((index, tool))
+
+        perm_results = await asyncio.gather(
+            *(tool.check_permissions(calls[index][1]) for index, tool in pending),
+            return_exceptions=True,
+        )
+
+        runnable: List[tuple[int, BaseTool, Dict[str, Any]]] = []
+        for (index, tool), perm_result in zip(pending, perm_results):
+            if isinstance(perm_result, BaseException):
+                results[index] = _format_exec_error(_reraise_fatal(perm_result))
+                continue
+            name, input = calls[index]
+            final_input, denied = await _resolve_permission(
+                name, input, perm_result, on_permission_request
+            )
+            if denied is not None:
+                results[index] = denied
+            else:
+                runnable.append((index, tool, final_input))
+
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        outcomes = await asyncio.gather(
+            *(_run_tool(tool, final_input, semaphore) for _, tool, final_input in runnable),
+            return_exceptions=True,
+        )
+        for (index, _, _), outcome in zip(runnable, outcomes):
+            results[index] = (
+                _format_exec_error(_reraise_fatal(outcome))
+                if isinstance(outcome, BaseException)
+                else outcome
             )
-            return await tool.execute(final_input)
+        return results  # type: ignore[return-value]
+
+
+async def _resolve_permission(
+    name: str,
+    input: Dict[str, Any],
+    perm_result: PermissionCheckResult,
+    on_permission_request: Optional[
+        Callable[[str, Dict[str, Any], Optional[str]], Awaitable[bool]]
+    ],
+) -> tuple[Dict[str, Any], Optional[ToolResult]]:
+    """Return the input to run with, or an error result if the call is denied.
+
+    Exceptions raised by ``on_permission_request`` are converted into an
+    error result.
+    """
+    behavior = perm_result.behavior
+    if behavior == "deny":
+        return input, {
+            "success": False,
+            "error": perm_result.message or "Permission denied by tool permission check",
+        }
+
+    if behavior == "ask":
+        if not on_permission_request:
+            return input, {
+                "success": False,
+                "error": perm_result.message
+                or "Permission required but no permission handler available",
+            }
+        try:
+            approved = await on_permission_request(name, input, perm_result.message)
         except Exception as exc:  # noqa: BLE001
-            return {"success": False, "error": str(exc)}
+            return input, _format_exec_error(exc)
+        if not approved:
+            return input, {"success": False, "error": "Permission denied by user"}
+
+    final_input = (
+        perm_result.updated_input
+        if perm_result.updated_input is not None
+        else input
+    )
+    return final_input, None
+
+
+async def _run_tool(
+    tool: BaseTool, input: Dict[str, Any], semaphore: Optional[asyncio.Semaphore]
+) -> ToolResult:
+    if semaphore is None:
+        return await tool.execute(input)
+    async with semaphore:
+        return await tool.execute(input)
+
+
+def _reraise_fatal(exc: BaseException) -> Exception:
+    """Pass ordinary exceptions through; re-raise cancellation and exits.
+
+    ``gather(return_exceptions=True)`` hands back ``CancelledError``,
+    ``KeyboardInterrupt`` and ``SystemExit`` like any other exception, but
+    ``execute`` only turns ``Exception`` into an error result.
+    """
+    if not isinstance(exc, Exception):
+        raise exc
+    return exc
+
+
+def _format_exec_error(exc: Exception) -> ToolResult:
+    return {"success": False, "error": str(exc)}
 
 
 def format_tool_result(result: ToolResult) -> str:
@@ -120,6 +328,18 @@ def format_tool_result(result: ToolResult) -> str:
     return f"Error: {result.get('error') or 'Unknown error'}"
 
 
+def format_tool_results(results: Iterable[ToolResult]) -> List[str]:
+    """Format many results at once; same output as mapping ``format_tool_result``."""
+    contents: List[str] = []
+    append = contents.append
+    for result in results:
+        if result.get("success"):
+            append(result.get("output") or "Success (no output)")
+        else:
+            append(f"Error: {result.get('error') or 'Unknown error'}")
+    return contents
+
+
 class ToolStreamProcessor:
     """Collect tool_use deltas from a Client stream and execute tools."""
 
@@ -130,10 +350,11 @@ class ToolStreamProcessor:
     ) -> None:
         self._registry = registry
         self._tool_result_formatter = tool_result_formatter or format_tool_result
+        self._is_default_formatter = self._tool_result_formatter is format_tool_result
 
     async def process_stream(
         self,
-        stream: Iterable[StreamEvent] | Any,
+        stream: Iterable[StreamEvent] | AsyncIterable[StreamEvent],
         on_tool_start: Optional[Callable[[str, Optional[Dict[str, Any]]], Awaitable[None]]] = None,
         on_tool_end: Optional[
             Callable[[str, Dict[str, Any], ToolResult], Awaitable[None]]
@@ -141,78 +362,136 @@ class ToolStreamProcessor:
         on_permission_request: Optional[
             Callable[[str, Dict[str, Any], Optional[str]], Awaitable[bool]]
         ] = None,
-    ) -> tuple[List[ToolUseBlock], List[ToolResultBlock]]:
-        tool_calls: Dict[str, Dict[str, Any]] = {}
-        current_tool_id: Optional[str] = None
+        max_concurrency: Optional[int] = None,
+    ) -> tuple[List[ToolUseBlockObj], List[ToolResultBlockObj]]:
+        """Collect tool calls from ``stream`` and execute them concurrently.
+
+        Tools run via ``ToolRegistry.execute_many``; ``max_concurrency`` bounds
+        how many execute at once. ``on_tool_end`` fires afterwards in stream order.
+        Blocks are returned as slotted objects; use ``to_dict()`` to serialize.
+        """
+        if _is_async_iterable(stream):
+            tool_calls = await self._collect_async(stream, on_tool_start)
+        else:
+            tool_calls = await self._collect_sync(stream, on_tool_start)
+
+        parsed_inputs: Dict[str, Dict[str, Any]] = {}
+        parse_errors: Dict[str, ToolResult] = {}
+        for tool_id, tool_call in tool_calls.items():
+            try:
+                parsed_inputs[tool_id] = tool_call.parse()
+            except _JSONError as exc:
+                parse_errors[tool_id] = {"success": False, "error": f"Parse error: {exc}"}
 
-        async for event in _ensure_async_iter(stream):
-            event_type = event.get("type")
-            if event_type == "tool_use_start":
-                current_tool_id = event.get("id") or ""
-                tool_calls[current_tool_id] = {
-                    "name": event.get("name") or "",
-                    "input": "",
-                }
-                if on_tool_start:
-                    await on_tool_start(event.get("name") or "", None)
-            elif event_type == "tool_use_delta":
-                tool_id = event.get("id") or current_tool_id or ""
-                if tool_id not in tool_calls:
-                    tool_calls[tool_id] = {"name": "", "input": ""}
-                tool_calls[tool_id]["input"] += event.get("input") or ""
+        outcomes = await self._registry.execute_many(
+            [(tool_calls[tool_id].name, parsed_input) for tool_id, parsed_input in parsed_inputs.items()],
+            on_permission_request,
+            max_concurrency,
+        )
+        executed = dict(zip(parsed_inputs, outcomes))
 
-        tool_use_blocks: List[ToolUseBlock] = []
-        tool_result_blocks: List[ToolResultBlock] = []
+        tool_use_blocks: List[ToolUseBlockObj] = []
+        result_ids: List[str] = []
+        results: List[ToolResult] = []
 
         for tool_id, tool_call in tool_calls.items():
-            tool_name = tool_call.get("name", "")
-            raw_input = tool_call.get("input", "")
-            try:
-                parsed_input = json.loads(raw_input or "{}")
-            except json.JSONDecodeError as exc:
-                result: ToolResult = {"success": False, "error": f"Parse error: {exc}"}
-                if on_tool_end:
-                    await on_tool_end(tool_name, {}, result)
-                tool_result_blocks.append(
-                    {
-                        "type": "tool_result",
-                        "tool_use_id": tool_id,
-                        "content": self._tool_result_formatter(result),
-                    }
-                )
-                continue
-
-            result = await self._registry.execute(
-                tool_name, parsed_input, on_permission_request
-            )
-            if on_tool_end:
+            tool_name = tool_call.name
+            result: ToolResult
+            if tool_id in parse_errors:
+                parsed_input: Dict[str, Any] = {}
+                result = parse_errors[tool_id]
+            else:
+                parsed_input = parsed_inputs[tool_id]
+                result = executed[tool_id]
+                tool_use_blocks.append(ToolUseBlockObj(tool_id, tool_name, parsed_input))
+
+            if on_tool_end is not None:
                 await on_tool_end(tool_name, parsed_input, result)
-
-            tool_use_blocks.append(
-                {
-                    "type": "tool_use",
-                    "id": tool_id,
-                    "name": tool_name,
-                    "input": parsed_input,
-                }
-            )
-            tool_result_blocks.append(
-                {
-                    "type": "tool_result",
-                    "tool_use_id": tool_id,
-                    "content": self._tool_result_formatter(result),
-                }
-            )
+            result_ids.append(tool_id)
+            results.append(result)
+
+        if self._is_default_formatter:
+            contents = format_tool_results(results)
+        else:
+            formatter = self._tool_result_formatter
+            contents = [formatter(result) for result in results]
+        tool_result_blocks = [
+            ToolResultBlockObj(tool_id, content) for tool_id, content in zip(result_ids, contents)
+        ]
 
         return tool_use_blocks, tool_result_blocks
 
+    # The two collectors below share one loop body, duplicated on purpose so
+    # async streams iterate directly without an adapter generator per event.
+
+    async def _collect_async(
+        self,
+        stream: AsyncIterable[StreamEvent],
+        on_tool_start: Optional[Callable[[str, Optional[Dict[str, Any]]], Awaitable[None]]],
+    ) -> Dict[str, _PartialToolCall]:
+        tool_calls: Dict[str, _PartialToolCall] = {}
+        current_tool_id: Optional[str] = None
 
-async def _ensure_async_iter(stream: Iterable[StreamEvent] | Any) -> Any:
-    if hasattr(stream, "__aiter__"):
-        async for item in stream:
-            yield item
-        return
+        async for event in stream:
+            # Identity checks hit for interned producers; == covers the rest.
+            event_type = event.get("type")
+            if event_type is _TOOL_USE_DELTA or event_type == _TOOL_USE_DELTA:
+                chunk = event.get("input")
+                tool_id = event.get("id") or current_tool_id or ""
+                tool_call = tool_calls.get(tool_id)
+                if tool_call is None:
+                    tool_call = tool_calls[tool_id] = _PartialToolCall()
+                if chunk:
+                    tool_call.feed(chunk)
+            elif event_type is _TOOL_USE_START or event_type == _TOOL_USE_START:
+                tool_id = event.get("id") or ""
+                name = event.get("name") or ""
+                current_tool_id = tool_id
+                tool_calls[tool_id] = _PartialToolCall(name=name)
+                if on_tool_start is not None:
+                    await on_tool_start(name, None)
+        return tool_calls
+
+    async def _collect_sync(
+        self,
+        stream: Iterable[StreamEvent],
+        on_tool_start: Optional[Callable[[str, Optional[Dict[str, Any]]], Awaitable[None]]],
+    ) -> Dict[str, _PartialToolCall]:
+        tool_calls: Dict[str, _PartialToolCall] = {}
+        current_tool_id: Optional[str] = None
 
-    for item in stream:
-        yield item
-        await asyncio.sleep(0)
+        for index, event in enumerate(stream):
+            # A long sync iterable would otherwise hold the event loop for its whole length.
+            if (index & _SYNC_YIELD_MASK) == _SYNC_YIELD_MASK:
+                await asyncio.sleep(0)
+            event_type = event.get("type")
+            if event_type is _TOOL_USE_DELTA or event_type == _TOOL_USE_DELTA:
+                chunk = event.get("input")
+                tool_id = event.get("id") or current_tool_id or ""
+                tool_call = tool_calls.get(tool_id)
+                if tool_call is None:
+                    tool_call = tool_calls[tool_id] = _PartialToolCall()
+                if chunk:
+                    tool_call.feed(chunk)
+            elif event_type is _TOOL_USE_START or event_type == _TOOL_USE_START:
+                tool_id = event.get("id") or ""
+                name = event.get("name") or ""
+                current_tool_id = tool_id
+                tool_calls[tool_id] = _PartialToolCall(name=name)
+                if on_tool_start is not None:
+                    await on_tool_start(name, None)
+        return tool_calls
+
+
+def _parse_tool_input(raw_input: str) -> Any:
+    return _json.loads(raw_input or "{}")
+
+
+def _is_async_iterable(stream: Any) -> bool:
+    stream_type = type(stream)
+    is_async = _ASYNC_TYPES.get(stream_type)
+    if is_async is None:
+        if len(_ASYNC_TYPES) >= _ASYNC_TYPES_MAX:
+            _ASYNC_TYPES.clear()
+        is_async = _ASYNC_TYPES[stream_type] = hasattr(stream_type, "__aiter__")
+    return is_async
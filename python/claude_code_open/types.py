@@ -1,6 +1,7 @@
 """Shared types for the Python Claude Code API surface."""
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Literal, Optional, TypedDict, Union
 
 
@@ -29,6 +30,31 @@ class ToolResultBlock(TypedDict):
     content: str
 
 
+@dataclass(slots=True, frozen=True)
+class ToolUseBlockObj:
+    """Slotted runtime form of ``ToolUseBlock``."""
+
+    id: str = ""
+    name: str = ""
+    input: Dict[str, Any] = field(default_factory=dict)
+    type: Literal["tool_use"] = "tool_use"
+
+    def to_dict(self) -> ToolUseBlock:
+        return {"type": self.type, "id": self.id, "name": self.name, "input": self.input}
+
+
+@dataclass(slots=True, frozen=True)
+class ToolResultBlockObj:
+    """Slotted runtime form of ``ToolResultBlock``."""
+
+    tool_use_id: str = ""
+    content: str = ""
+    type: Literal["tool_result"] = "tool_result"
+
+    def to_dict(self) -> ToolResultBlock:
+        return {"type": self.type, "tool_use_id": self.tool_use_id, "content": self.content}
+
+
 class TextBlock(TypedDict):
     type: Literal["text"]
     text: str
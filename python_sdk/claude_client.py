@@ -4,11 +4,20 @@ Python Claude API client mirroring src/core/client.ts behavior.
 
 from __future__ import annotations
 
+import functools
+import hashlib
+import json
 import os
+import random
+import re
+import secrets
+import sys
 import time
 import uuid
-from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
 import httpx
 from anthropic import Anthropic
@@ -18,12 +27,40 @@ CLAUDE_CODE_BETA = "claude-code-20250219"
 OAUTH_BETA = "oauth-2025-04-20"
 THINKING_BETA = "interleaved-thinking-2025-05-14"
 
+# Values of the "type" key in events yielded by create_message_stream. They are
+# interned, so consumers may compare with ``is`` as well as ``==``.
+EVENT_TEXT = sys.intern("text")
+EVENT_THINKING = sys.intern("thinking")
+EVENT_TOOL_USE_START = sys.intern("tool_use_start")
+EVENT_TOOL_USE_DELTA = sys.intern("tool_use_delta")
+EVENT_USAGE = sys.intern("usage")
+EVENT_STOP = sys.intern("stop")
+EVENT_ERROR = sys.intern("error")
+
+# Stream event and delta type names, interned so the hot loop can try identity first.
+_CONTENT_BLOCK_DELTA = sys.intern("content_block_delta")
+_CONTENT_BLOCK_START = sys.intern("content_block_start")
+_MESSAGE_DELTA = sys.intern("message_delta")
+_MESSAGE_START = sys.intern("message_start")
+_MESSAGE_STOP = sys.intern("message_stop")
+_TEXT_DELTA = sys.intern("text_delta")
+_THINKING_DELTA = sys.intern("thinking_delta")
+_INPUT_JSON_DELTA = sys.intern("input_json_delta")
+_TOOL_USE = sys.intern("tool_use")
+
+# Shared across requests; the SDK only reads these when building the beta header.
+_BETAS_OAUTH = [CLAUDE_CODE_BETA, OAUTH_BETA, THINKING_BETA]
+_BETAS_APIKEY = [THINKING_BETA]
+
 CLAUDE_CODE_IDENTITY = "You are Claude Code, Anthropic's official CLI for Claude."
 CLAUDE_CODE_AGENT_SDK_IDENTITY = (
     "You are Claude Code, Anthropic's official CLI for Claude, running within the Claude Agent SDK."
 )
 CLAUDE_AGENT_IDENTITY = "You are a Claude agent, built on Anthropic's Claude Agent SDK."
 
+_IDENTITY_PREFIXES = (CLAUDE_CODE_IDENTITY, CLAUDE_CODE_AGENT_SDK_IDENTITY, CLAUDE_AGENT_IDENTITY)
+_IDENTITY_PREFIX_LENS = tuple((prefix, len(prefix)) for prefix in _IDENTITY_PREFIXES)
+
 RETRYABLE_ERRORS = [
     "overloaded_error",
     "rate_limit_error",
@@ -36,8 +73,75 @@ RETRYABLE_ERRORS = [
     "model_unavailable",
 ]
 
+_RETRYABLE_RE = re.compile("|".join(re.escape(token.lower()) for token in RETRYABLE_ERRORS))
+
+
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60.0)
+
+try:
+    import h2  # type: ignore  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+class _SharedHttpClient(httpx.Client):
+    """Process-wide pooled client handed to several ``Anthropic`` instances.
+
+    ``Anthropic.close()`` (also run by its context manager) closes the client it
+    was given; with a shared pool that would kill the transport under every
+    other live ClaudeClient, so closing is a no-op and the pool lives for the
+    process.
+    """
+
+    def close(self) -> None:
+        pass
+
+
+_HttpClientKey = Tuple[Optional[FrozenSet[Tuple[str, str]]], Optional[Tuple[Tuple[str, Optional[float]], ...]]]
+_shared_http_clients: Dict[_HttpClientKey, _SharedHttpClient] = {}
+
+
+def _new_http_client(proxies: Optional[Dict[str, str]], timeout: Optional[httpx.Timeout]) -> httpx.Client:
+    return httpx.Client(proxies=proxies, timeout=timeout, limits=_HTTP_LIMITS, http2=_HTTP2_AVAILABLE)
 
-@dataclass
+
+def _get_shared_http_client(proxies: Optional[Dict[str, str]], timeout: Optional[httpx.Timeout]) -> httpx.Client:
+    """Return the process-wide pooled client for this proxy/timeout combination."""
+    key: _HttpClientKey = (
+        frozenset(proxies.items()) if proxies else None,
+        tuple(sorted(timeout.as_dict().items())) if timeout is not None else None,
+    )
+    client = _shared_http_clients.get(key)
+    if client is None:
+        client = _shared_http_clients[key] = _SharedHttpClient(
+            proxies=proxies, timeout=timeout, limits=_HTTP_LIMITS, http2=_HTTP2_AVAILABLE
+        )
+    return client
+
+
+def _system_proxies_snapshot() -> Dict[str, str]:
+    """Read http(s)_proxy from the environment; lowercase names win over uppercase."""
+    environ = os.environ
+    found: Dict[str, str] = {}
+    for key, lower_name, upper_name in (
+        ("http", "http_proxy", "HTTP_PROXY"),
+        ("https", "https_proxy", "HTTPS_PROXY"),
+    ):
+        value = environ.get(lower_name) or environ.get(upper_name)
+        if value:
+            found[key] = value
+    return found
+
+
+def _is_retryable(error_message: str, error_type: Any) -> bool:
+    """Match RETRYABLE_ERRORS case-insensitively against an error's message or type."""
+    return bool(
+        _RETRYABLE_RE.search(error_message.lower()) or _RETRYABLE_RE.search(str(error_type).lower())
+    )
+
+
+@dataclass(slots=True)
 class ProxyConfig:
     http: Optional[str] = None
     https: Optional[str] = None
@@ -48,7 +152,7 @@ class ProxyConfig:
     use_system_proxy: bool = True
 
 
-@dataclass
+@dataclass(slots=True)
 class TimeoutConfig:
     connect: Optional[int] = None
     request: Optional[int] = None
@@ -56,7 +160,7 @@ class TimeoutConfig:
     idle: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ThinkingConfig:
     enabled: bool = False
     budget_tokens: int = 10000
@@ -64,7 +168,7 @@ class ThinkingConfig:
     timeout: int = 120000
 
 
-@dataclass
+@dataclass(slots=True)
 class ThinkingResult:
     thinking: str
     thinking_tokens: int
@@ -72,7 +176,7 @@ class ThinkingResult:
     budget_exhausted: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientConfig:
     api_key: Optional[str] = None
     auth_token: Optional[str] = None
@@ -86,9 +190,13 @@ class ClientConfig:
     debug: bool = False
     fallback_model: Optional[str] = None
     thinking: Optional[ThinkingConfig] = None
+    # Coalesce streamed text deltas until this many ms or chars accumulate; 0 disables.
+    text_batch_ms: float = 0
+    text_batch_chars: int = 0
+    response_cache: Optional["ResponseCache"] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class StreamCallbacks:
     on_text: Optional[Callable[[str], None]] = None
     on_tool_use: Optional[Callable[[str, str, Any], None]] = None
@@ -97,7 +205,7 @@ class StreamCallbacks:
     on_complete: Optional[Callable[[], None]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class UsageStats:
     input_tokens: int
     output_tokens: int
@@ -107,9 +215,21 @@ class UsageStats:
     cache_creation_tokens: int = 0
     thinking_tokens: int = 0
     api_duration_ms: int = 0
+    # Streams answered from a ResponseCache; their tokens are not billed above.
+    response_cache_hits: int = 0
+    response_cache_tokens: int = 0
+
+    def cache_hit_rate(self) -> float:
+        """Share of prompt tokens served from the prompt cache.
 
+        The API's input_tokens excludes cache reads and writes, so the denominator
+        adds them back to get the full prompt size.
+        """
+        prompt_tokens = self.input_tokens + self.cache_read_tokens + self.cache_creation_tokens
+        return self.cache_read_tokens / prompt_tokens if prompt_tokens else 0.0
 
-@dataclass
+
+@dataclass(slots=True)
 class ModelPricing:
     input: float
     output: float
@@ -118,7 +238,7 @@ class ModelPricing:
     thinking: float = 0.0
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelInfo:
     model_id: str
     display_name: str
@@ -128,7 +248,7 @@ class ModelInfo:
     supports_thinking: bool
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ModelCapabilities:
     context_window: int
     max_output_tokens: int
@@ -137,7 +257,7 @@ class ModelCapabilities:
     thinking_budget_max: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelUsageStats:
     input_tokens: int = 0
     output_tokens: int = 0
@@ -149,11 +269,22 @@ class ModelUsageStats:
     api_duration_ms: int = 0
 
 
+_DEFAULT_CAPABILITIES = ModelCapabilities(
+    context_window=200_000,
+    max_output_tokens=8192,
+    supports_thinking=False,
+)
+
+
 class ModelConfig:
     def __init__(self) -> None:
         self._models: Dict[str, ModelInfo] = {}
         self._aliases: Dict[str, str] = {}
         self._pricing: Dict[str, ModelPricing] = {}
+        self._capabilities_cache: Dict[str, ModelCapabilities] = {}
+        # Per-token (input, output, cache_read, cache_create, thinking) rates.
+        self._rates: Dict[str, Tuple[float, float, float, float, float]] = {}
+        self._resolve_cached = functools.lru_cache(maxsize=512)(self._resolve_alias_uncached)
         self._initialize_models()
 
     def _initialize_models(self) -> None:
@@ -204,26 +335,34 @@ class ModelConfig:
                 self._aliases[alias.lower()] = model.model_id
 
         self._pricing.update(pricing)
+        for model_id, price in pricing.items():
+            self._rates[model_id] = (
+                price.input / 1_000_000,
+                price.output / 1_000_000,
+                price.cache_read / 1_000_000,
+                price.cache_create / 1_000_000,
+                price.thinking / 1_000_000,
+            )
+
+        for model in models:
+            self._capabilities_cache[model.model_id] = ModelCapabilities(
+                context_window=model.context_window,
+                max_output_tokens=model.max_output_tokens,
+                supports_thinking=model.supports_thinking,
+                thinking_budget_min=1024 if model.supports_thinking else None,
+                thinking_budget_max=128_000 if model.supports_thinking else None,
+            )
+        self._resolve_cached.cache_clear()
 
     def resolve_alias(self, model_id_or_alias: str) -> str:
+        return self._resolve_cached(model_id_or_alias)
+
+    def _resolve_alias_uncached(self, model_id_or_alias: str) -> str:
         return self._aliases.get(model_id_or_alias.lower(), model_id_or_alias)
 
     def get_capabilities(self, model_id_or_alias: str) -> ModelCapabilities:
-        model_id = self.resolve_alias(model_id_or_alias)
-        model = self._models.get(model_id)
-        if not model:
-            return ModelCapabilities(
-                context_window=200_000,
-                max_output_tokens=8192,
-                supports_thinking=False,
-            )
-        return ModelCapabilities(
-            context_window=model.context_window,
-            max_output_tokens=model.max_output_tokens,
-            supports_thinking=model.supports_thinking,
-            thinking_budget_min=1024 if model.supports_thinking else None,
-            thinking_budget_max=128_000 if model.supports_thinking else None,
-        )
+        """Return the shared, immutable capabilities record for a model."""
+        return self._capabilities_cache.get(self.resolve_alias(model_id_or_alias), _DEFAULT_CAPABILITIES)
 
     def calculate_cost(
         self,
@@ -234,15 +373,54 @@ class ModelConfig:
         cache_creation_tokens: int = 0,
         thinking_tokens: int = 0,
     ) -> float:
-        pricing = self._pricing.get(self.resolve_alias(model_id))
-        if not pricing:
+        return self._cost_for(
+            self.resolve_alias(model_id),
+            input_tokens,
+            output_tokens,
+            cache_read_tokens,
+            cache_creation_tokens,
+            thinking_tokens,
+        )
+
+    def resolve_and_cost(
+        self,
+        model_id: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+        thinking_tokens: int = 0,
+    ) -> Tuple[str, float]:
+        """Resolve ``model_id`` and price the usage in one step."""
+        resolved = self.resolve_alias(model_id)
+        return resolved, self._cost_for(
+            resolved,
+            input_tokens,
+            output_tokens,
+            cache_read_tokens,
+            cache_creation_tokens,
+            thinking_tokens,
+        )
+
+    def _cost_for(
+        self,
+        resolved_model_id: str,
+        input_tokens: int,
+        output_tokens: int,
+        cache_read_tokens: int,
+        cache_creation_tokens: int,
+        thinking_tokens: int,
+    ) -> float:
+        rates = self._rates.get(resolved_model_id)
+        if not rates:
             return 0.0
+        input_rate, output_rate, cache_read_rate, cache_create_rate, thinking_rate = rates
         return (
-            (input_tokens / 1_000_000) * pricing.input
-            + (output_tokens / 1_000_000) * pricing.output
-            + (cache_read_tokens / 1_000_000) * pricing.cache_read
-            + (cache_creation_tokens / 1_000_000) * pricing.cache_create
-            + (thinking_tokens / 1_000_000) * pricing.thinking
+            input_tokens * input_rate
+            + output_tokens * output_rate
+            + cache_read_tokens * cache_read_rate
+            + cache_creation_tokens * cache_create_rate
+            + thinking_tokens * thinking_rate
         )
 
 
@@ -251,6 +429,10 @@ class ModelStats:
         self._model_config = model_config
         self._stats: Dict[str, ModelUsageStats] = {}
         self._global = ModelUsageStats()
+        # Most sessions hit the same model repeatedly; skip the resolve and dict lookup for it.
+        self._last_model_id = ""
+        self._last_resolved = ""
+        self._last_stats: Optional[ModelUsageStats] = None
 
     def record(
         self,
@@ -261,17 +443,32 @@ class ModelStats:
         cache_creation_tokens: int = 0,
         thinking_tokens: int = 0,
         api_duration_ms: int = 0,
+        *,
+        cost: Optional[float] = None,
     ) -> None:
-        resolved = self._model_config.resolve_alias(model_id)
-        stats = self._stats.setdefault(resolved, ModelUsageStats())
-        cost = self._model_config.calculate_cost(
-            resolved,
-            input_tokens,
-            output_tokens,
-            cache_read_tokens,
-            cache_creation_tokens,
-            thinking_tokens,
-        )
+        """Accumulate one API call under the model's resolved id.
+
+        Aliases are accepted. Pass ``cost`` when the call was already priced;
+        otherwise it is computed from the model's rates.
+        """
+        if model_id == self._last_model_id and self._last_stats is not None:
+            resolved = self._last_resolved
+            stats = self._last_stats
+        else:
+            resolved = self._model_config.resolve_alias(model_id)
+            stats = self._stats.setdefault(resolved, ModelUsageStats())
+            self._last_model_id = model_id
+            self._last_resolved = resolved
+            self._last_stats = stats
+        if cost is None:
+            cost = self._model_config._cost_for(
+                resolved,
+                input_tokens,
+                output_tokens,
+                cache_read_tokens,
+                cache_creation_tokens,
+                thinking_tokens,
+            )
 
         stats.input_tokens += input_tokens
         stats.output_tokens += output_tokens
@@ -282,21 +479,23 @@ class ModelStats:
         stats.api_calls += 1
         stats.api_duration_ms += api_duration_ms
 
-        self._global.input_tokens += input_tokens
-        self._global.output_tokens += output_tokens
-        self._global.cache_read_tokens += cache_read_tokens
-        self._global.cache_creation_tokens += cache_creation_tokens
-        self._global.thinking_tokens += thinking_tokens
-        self._global.cost_usd += cost
-        self._global.api_calls += 1
-        self._global.api_duration_ms += api_duration_ms
+        totals = self._global
+        totals.input_tokens += input_tokens
+        totals.output_tokens += output_tokens
+        totals.cache_read_tokens += cache_read_tokens
+        totals.cache_creation_tokens += cache_creation_tokens
+        totals.thinking_tokens += thinking_tokens
+        totals.cost_usd += cost
+        totals.api_calls += 1
+        totals.api_duration_ms += api_duration_ms
 
     def get_by_model(self, model_id: str) -> ModelUsageStats:
         resolved = self._model_config.resolve_alias(model_id)
-        return ModelUsageStats(**self._stats.get(resolved, ModelUsageStats()).__dict__)
+        stats = self._stats.get(resolved)
+        return replace(stats) if stats is not None else ModelUsageStats()
 
     def get_global(self) -> ModelUsageStats:
-        return ModelUsageStats(**self._global.__dict__)
+        return replace(self._global)
 
 
 class ThinkingManager:
@@ -316,10 +515,10 @@ class ThinkingManager:
             budget = min(capabilities.thinking_budget_max, budget)
         return {"thinking": {"type": "enabled", "budget_tokens": budget}}
 
-    def process_thinking_response(self, thinking: Optional[str], thinking_tokens: int, start_time: float) -> Optional[ThinkingResult]:
+    def process_thinking_response(self, thinking: Optional[str], thinking_tokens: int, start_ns: int) -> Optional[ThinkingResult]:
         if not thinking:
             return None
-        thinking_time_ms = int((time.time() - start_time) * 1000)
+        thinking_time_ms = (time.monotonic_ns() - start_ns) // 1_000_000
         budget_exhausted = thinking_tokens >= int(self._config.budget_tokens * 0.95)
         return ThinkingResult(
             thinking=thinking,
@@ -330,78 +529,47 @@ class ThinkingManager:
 
 
 class ModelFallback:
+    """Switch to the fallback model once the primary fails with a retryable error.
+
+    Backoff is left to the operation itself (ClaudeClient._with_retry), so each
+    model gets exactly one retry budget.
+    """
+
     def __init__(self, primary_model: str, fallback_model: Optional[str], model_config: ModelConfig) -> None:
         self._primary = primary_model
         self._fallback = fallback_model
         self._model_config = model_config
-        self._retryable_errors = RETRYABLE_ERRORS
-        self._max_retries = 3
-        self._retry_delay = 1000
 
     def execute_with_fallback(
         self,
         operation: Callable[[str], Any],
-        on_retry: Optional[Callable[[str, int, Exception], None]] = None,
         on_fallback: Optional[Callable[[str, str, Exception], None]] = None,
     ) -> Dict[str, Any]:
-        current_model = self._primary
-        used_fallback = False
-        retry_count = 0
-        last_error: Optional[Exception] = None
-
-        attempt = 0
-        while attempt <= self._max_retries:
-            try:
-                result = operation(current_model)
-                return {"result": result, "model": current_model, "retries": retry_count, "used_fallback": used_fallback}
-            except Exception as exc:
-                last_error = exc
-                error_message = str(exc).lower()
-                error_type = getattr(exc, "type", "") or getattr(exc, "code", "")
-                retryable = any(
-                    token in error_message or token in str(error_type).lower() for token in self._retryable_errors
-                )
-
-                if retryable and attempt < self._max_retries:
-                    retry_count += 1
-                    delay = self._retry_delay * (2 ** attempt)
-                    if on_retry:
-                        on_retry(current_model, attempt + 1, exc)
-                    time.sleep(delay / 1000)
-                    attempt += 1
-                    continue
-
-                if current_model == self._primary and self._fallback and retryable:
-                    current_model = self._fallback
-                    used_fallback = True
-                    if on_fallback:
-                        on_fallback(self._primary, self._fallback, exc)
-                    attempt = 0
-                    continue
-                break
+        try:
+            return {"result": operation(self._primary), "model": self._primary, "used_fallback": False}
+        except Exception as exc:
+            error_type = getattr(exc, "type", "") or getattr(exc, "code", "")
+            if not self._fallback or not _is_retryable(str(exc), error_type):
+                raise
+            if on_fallback:
+                on_fallback(self._primary, self._fallback, exc)
 
-        raise last_error or RuntimeError("Unknown failure")
+        return {"result": operation(self._fallback), "model": self._fallback, "used_fallback": True}
 
 
 model_config = ModelConfig()
 model_stats = ModelStats(model_config)
 
-_session_id: Optional[str] = None
-_user_id: Optional[str] = None
-
-
-def _get_session_id() -> str:
-    global _session_id
-    if _session_id is None:
-        _session_id = str(uuid.uuid4())
-    return _session_id
+_USER_ID_STRING: Optional[str] = None
+_METADATA_CACHE: Optional[Dict[str, str]] = None
 
 
-def _get_user_id() -> str:
-    global _user_id
-    if _user_id is None:
-        _user_id = uuid.uuid4().hex
-    return _user_id
+def _get_user_id_string() -> str:
+    """Return the process-wide metadata user_id, generating it on first use."""
+    global _USER_ID_STRING
+    if _USER_ID_STRING is None:
+        _USER_ID_STRING = f"user_{secrets.token_hex(16)}_account__session_{uuid.uuid4()}"
+    return _USER_ID_STRING
 
 
 def has_valid_identity(system_prompt: Optional[str | List[Dict[str, str]]]) -> bool:
@@ -409,17 +577,12 @@ def has_valid_identity(system_prompt: Optional[str | List[Dict[str, str]]]) -> b
         return False
 
     if isinstance(system_prompt, str):
-        return system_prompt.startswith(CLAUDE_CODE_IDENTITY) or system_prompt.startswith(
-            CLAUDE_CODE_AGENT_SDK_IDENTITY
-        ) or system_prompt.startswith(CLAUDE_AGENT_IDENTITY)
+        return system_prompt.startswith(_IDENTITY_PREFIXES)
 
     if isinstance(system_prompt, list) and system_prompt:
         first_block = system_prompt[0]
         if first_block.get("type") == "text" and first_block.get("text"):
-            text = first_block["text"]
-            return text.startswith(CLAUDE_CODE_IDENTITY) or text.startswith(CLAUDE_CODE_AGENT_SDK_IDENTITY) or text.startswith(
-                CLAUDE_AGENT_IDENTITY
-            )
+            return first_block["text"].startswith(_IDENTITY_PREFIXES)
 
     return False
 
@@ -431,24 +594,18 @@ def format_system_prompt(system_prompt: Optional[str], is_oauth: bool) -> Option
     if not system_prompt:
         return [{"type": "text", "text": CLAUDE_CODE_IDENTITY, "cache_control": {"type": "ephemeral"}}]
 
-    identity_to_use = CLAUDE_CODE_IDENTITY
-    remaining_text = ""
-
-    if system_prompt.startswith(CLAUDE_CODE_IDENTITY):
-        identity_to_use = CLAUDE_CODE_IDENTITY
-        remaining_text = system_prompt[len(CLAUDE_CODE_IDENTITY) :].strip()
-    elif system_prompt.startswith(CLAUDE_CODE_AGENT_SDK_IDENTITY):
-        identity_to_use = CLAUDE_CODE_AGENT_SDK_IDENTITY
-        remaining_text = system_prompt[len(CLAUDE_CODE_AGENT_SDK_IDENTITY) :].strip()
-    elif system_prompt.startswith(CLAUDE_AGENT_IDENTITY):
-        identity_to_use = CLAUDE_AGENT_IDENTITY
-        remaining_text = system_prompt[len(CLAUDE_AGENT_IDENTITY) :].strip()
-    else:
+    # One C-level check covers the common no-identity case; only a hit resolves which prefix matched.
+    if not system_prompt.startswith(_IDENTITY_PREFIXES):
         return [
             {"type": "text", "text": CLAUDE_CODE_IDENTITY, "cache_control": {"type": "ephemeral"}},
             {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}},
         ]
 
+    identity_to_use, prefix_len = next(
+        (prefix, length) for prefix, length in _IDENTITY_PREFIX_LENS if system_prompt.startswith(prefix)
+    )
+    remaining_text = system_prompt[prefix_len:].strip()
+
     blocks: List[Dict[str, Any]] = [
         {"type": "text", "text": identity_to_use, "cache_control": {"type": "ephemeral"}}
     ]
@@ -457,6 +614,250 @@ def format_system_prompt(system_prompt: Optional[str], is_oauth: bool) -> Option
     return blocks
 
 
+def _sdk_declares_field(model_name: str, field_name: str) -> bool:
+    """Whether the installed SDK's beta usage model declares ``field_name`` (pydantic v1 or v2)."""
+    try:
+        from anthropic.types import beta as beta_types
+    except ImportError:  # pragma: no cover - older SDKs without beta types
+        return False
+    model = getattr(beta_types, model_name, None)
+    fields = getattr(model, "model_fields", None) or getattr(model, "__fields__", None) or {}
+    return field_name in fields
+
+
+# Probed once so the stream handlers can read usage fields directly instead of via getattr defaults.
+_START_USAGE_HAS_THINKING = _sdk_declares_field("BetaUsage", "thinking_tokens")
+_DELTA_USAGE_HAS_THINKING = _sdk_declares_field("BetaMessageDeltaUsage", "thinking_tokens")
+
+
+@dataclass(slots=True)
+class _StreamState:
+    """Per-stream counters plus the callbacks bound once before the event loop."""
+
+    on_text: Optional[Callable[[str], None]] = None
+    on_tool_use: Optional[Callable[[str, str, Any], None]] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+    thinking_tokens: int = 0
+    # None until a usage payload reports thinking tokens directly.
+    reported_thinking_tokens: Optional[int] = None
+    saw_thinking: bool = False
+    # Running size of streamed text, used only to estimate output tokens when the
+    # stream never reports usage; the text itself is not kept.
+    streamed_chars: int = 0
+    stopped: bool = False
+    # Opt-in text batching (see ClientConfig.text_batch_ms / text_batch_chars).
+    batch_seconds: float = 0.0
+    batch_chars: int = 0
+    text_buf: List[str] = field(default_factory=list)
+    buffered_chars: int = 0
+    buffer_started: float = 0.0
+    # Set when the caller opts into reused event dicts; None means build a fresh dict per event.
+    text_event: Optional[Dict[str, Any]] = None
+    thinking_event: Optional[Dict[str, Any]] = None
+    tool_delta_event: Optional[Dict[str, Any]] = None
+    tool_start_event: Optional[Dict[str, Any]] = None
+    # Set when the response cache missed: emitted events are copied here and stored under cache_key.
+    cache_key: Optional[str] = None
+    recorded: Optional[List[Dict[str, Any]]] = None
+
+
+def _on_content_block_delta(event: Any, state: _StreamState) -> Optional[Dict[str, Any]]:
+    delta = event.delta
+    kind = delta.type
+    # Text deltas are the vast majority of events, so they are checked first.
+    if kind is _TEXT_DELTA or kind == _TEXT_DELTA:
+        text = delta.text
+        state.streamed_chars += len(text)
+        if state.batch_seconds or state.batch_chars:
+            return _buffer_text(state, text)
+        if state.on_text:
+            state.on_text(text)
+        return _text_event(state, text)
+    if kind is _THINKING_DELTA or kind == _THINKING_DELTA:
+        state.saw_thinking = True
+        state.streamed_chars += len(delta.thinking)
+        out = state.thinking_event
+        if out is None:
+            return {"type": EVENT_THINKING, "thinking": delta.thinking}
+        out["thinking"] = delta.thinking
+        return out
+    if kind is _INPUT_JSON_DELTA or kind == _INPUT_JSON_DELTA:
+        out = state.tool_delta_event
+        if out is None:
+            return {"type": EVENT_TOOL_USE_DELTA, "input": delta.partial_json}
+        out["input"] = delta.partial_json
+        return out
+    return None
+
+
+def _text_event(state: _StreamState, text: str) -> Dict[str, Any]:
+    out = state.text_event
+    if out is None:
+        return {"type": EVENT_TEXT, "text": text}
+    out["text"] = text
+    return out
+
+
+def _buffer_text(state: _StreamState, text: str) -> Optional[Dict[str, Any]]:
+    buf = state.text_buf
+    if not buf:
+        state.buffer_started = time.monotonic()
+    buf.append(text)
+    state.buffered_chars += len(text)
+    if (state.batch_chars and state.buffered_chars >= state.batch_chars) or (
+        state.batch_seconds and time.monotonic() - state.buffer_started >= state.batch_seconds
+    ):
+        return _flush_text(state)
+    return None
+
+
+def _flush_text(state: _StreamState) -> Dict[str, Any]:
+    text = "".join(state.text_buf)
+    state.text_buf.clear()
+    state.buffered_chars = 0
+    if state.on_text:
+        state.on_text(text)
+    return _text_event(state, text)
+
+
+def _on_content_block_start(event: Any, state: _StreamState) -> Optional[Dict[str, Any]]:
+    block = event.content_block
+    kind = block.type
+    if kind is not _TOOL_USE and kind != _TOOL_USE:
+        return None
+    if state.on_tool_use:
+        state.on_tool_use(block.id, block.name, block.input)
+    out = state.tool_start_event
+    if out is None:
+        return {"type": EVENT_TOOL_USE_START, "id": block.id, "name": block.name}
+    out["id"] = block.id
+    out["name"] = block.name
+    return out
+
+
+def _on_message_delta(event: Any, state: _StreamState) -> None:
+    usage = event.usage
+    if usage:
+        state.output_tokens = usage.output_tokens
+        if _DELTA_USAGE_HAS_THINKING and usage.thinking_tokens is not None:
+            state.reported_thinking_tokens = usage.thinking_tokens
+
+
+def _on_message_start(event: Any, state: _StreamState) -> None:
+    message = event.message
+    if message and message.usage:
+        usage = message.usage
+        state.input_tokens = usage.input_tokens
+        state.cache_read_tokens = usage.cache_read_input_tokens or 0
+        state.cache_creation_tokens = usage.cache_creation_input_tokens or 0
+        if _START_USAGE_HAS_THINKING and usage.thinking_tokens is not None:
+            state.reported_thinking_tokens = usage.thinking_tokens
+
+
+def _on_message_stop(event: Any, state: _StreamState) -> None:
+    state.stopped = True
+
+
+_STREAM_HANDLERS: Dict[str, Callable[[Any, _StreamState], Optional[Dict[str, Any]]]] = {
+    _CONTENT_BLOCK_DELTA: _on_content_block_delta,
+    _CONTENT_BLOCK_START: _on_content_block_start,
+    _MESSAGE_DELTA: _on_message_delta,
+    _MESSAGE_START: _on_message_start,
+    _MESSAGE_STOP: _on_message_stop,
+}
+
+
+def _step_stream_event(
+    event: Any, state: _StreamState
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Handle one SDK event and return ``(flushed_text, output)``; either may be None."""
+    handler = _STREAM_HANDLERS.get(event.type)
+    if handler is None:
+        return None, None
+    flushed = None
+    # Buffered text goes out before any other event so ordering is preserved.
+    if state.text_buf and (handler is not _on_content_block_delta or event.delta.type != _TEXT_DELTA):
+        flushed = _flush_text(state)
+        if state.recorded is not None:
+            state.recorded.append(dict(flushed))
+    out = handler(event, state)
+    if out is not None and state.recorded is not None:
+        state.recorded.append(dict(out))
+    return flushed, out
+
+
+def _flush_stream_tail(state: _StreamState) -> Optional[Dict[str, Any]]:
+    """Flush text still buffered when the SDK stream ends."""
+    if not state.text_buf:
+        return None
+    flushed = _flush_text(state)
+    if state.recorded is not None:
+        state.recorded.append(dict(flushed))
+    return flushed
+
+
+class ResponseCache:
+    """In-memory LRU of completed streamed responses, keyed by request parameters.
+
+    An entry holds the yielded events (minus usage/stop) and the usage dict, so a
+    repeated request can be replayed without contacting the API.
+    """
+
+    def __init__(self, max_entries: int = 128) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Tuple[Dict[str, Any], ...], Dict[str, int]]]" = OrderedDict()
+
+    @staticmethod
+    def key_for(request_params: Dict[str, Any]) -> str:
+        # Metadata carries the per-process user id and must not split otherwise identical requests.
+        keyed = {k: v for k, v in request_params.items() if k != "metadata"}
+        payload = json.dumps(keyed, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[Tuple[Dict[str, Any], ...], Dict[str, int]]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, events: Tuple[Dict[str, Any], ...], usage: Dict[str, int]) -> None:
+        self._entries[key] = (events, usage)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_MESSAGE_KEYS = frozenset({"role", "content"})
+_TOOL_KEYS = frozenset({"name", "description", "input_schema"})
+
+
+def _prepare_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pass messages through when already in API shape, otherwise project them."""
+    if all(m.keys() == _MESSAGE_KEYS for m in messages):
+        return messages
+    return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+
+def _prepare_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Pass tools through when already in API shape, otherwise project them."""
+    if all(t.keys() == _TOOL_KEYS for t in tools):
+        return tools
+    return [
+        {
+            "name": t["name"],
+            "description": t.get("description"),
+            "input_schema": t.get("input_schema") or t.get("inputSchema"),
+        }
+        for t in tools
+    ]
+
+
 class ClaudeClient:
     def __init__(self, config: Optional[ClientConfig] = None) -> None:
         config = config or ClientConfig()
@@ -494,6 +895,9 @@ class ClaudeClient:
         self.max_tokens = config.max_tokens or min(32000, capabilities.max_output_tokens)
         self.max_retries = config.max_retries if config.max_retries is not None else 2
         self.retry_delay = config.retry_delay if config.retry_delay is not None else 1000
+        self.text_batch_ms = config.text_batch_ms
+        self.text_batch_chars = config.text_batch_chars
+        self.response_cache = config.response_cache
         self.fallback_model = None
         if config.fallback_model:
             resolved_fallback = model_config.resolve_alias(config.fallback_model)
@@ -513,6 +917,8 @@ class ClaudeClient:
             thinking_tokens=0,
             api_duration_ms=0,
         )
+        # (estimated_cost, formatted string) from the last get_formatted_cost call.
+        self._cost_cache: Tuple[float, str] = (-1.0, "")
 
         if self.debug:
             print(f"[ClaudeClient] Initialized with model: {self.model}")
@@ -524,18 +930,16 @@ class ClaudeClient:
     def _create_http_client(self, config: ClientConfig) -> httpx.Client:
         proxies = self._build_proxies(config.proxy)
         timeout = self._build_timeout(config.timeout)
-        return httpx.Client(proxies=proxies, timeout=timeout)
+        # Credentials embedded in proxy URLs stay on a private client.
+        if config.proxy and config.proxy.username and config.proxy.password:
+            return _new_http_client(proxies, timeout)
+        return _get_shared_http_client(proxies, timeout)
 
     def _build_proxies(self, proxy: Optional[ProxyConfig]) -> Optional[Dict[str, str]]:
         if not proxy:
             return None
 
-        proxies: Dict[str, str] = {}
-        if proxy.use_system_proxy:
-            for key in ("http", "https"):
-                env_value = os.getenv(f"{key}_proxy") or os.getenv(f"{key.upper()}_PROXY")
-                if env_value:
-                    proxies[key] = env_value
+        proxies: Dict[str, str] = _system_proxies_snapshot() if proxy.use_system_proxy else {}
 
         if proxy.http:
             proxies["http"] = proxy.http
@@ -546,9 +950,10 @@ class ClaudeClient:
 
         if proxy.username and proxy.password:
             for key, value in list(proxies.items()):
-                if "@" not in value:
-                    scheme, rest = value.split("://", 1) if "://" in value else ("http", value)
-                    proxies[key] = f"{scheme}://{proxy.username}:{proxy.password}@{rest}"
+                parts = urlsplit(value if "://" in value else f"http://{value}")
+                if "@" not in parts.netloc:
+                    netloc = f"{proxy.username}:{proxy.password}@{parts.netloc}"
+                    proxies[key] = urlunsplit(parts._replace(netloc=netloc))
 
         return proxies or None
 
@@ -565,57 +970,42 @@ class ClaudeClient:
             pool=(timeout.idle or 60000) / 1000,
         )
 
-    def _with_retry(self, operation: Callable[[], Any], retry_count: int = 0) -> Any:
-        try:
-            return operation()
-        except Exception as exc:
-            error_message = str(exc)
-            error_type = getattr(exc, "type", "") or getattr(exc, "code", "")
-            error_status = getattr(exc, "status", "") or getattr(exc, "status_code", "")
-            is_retryable = any(
-                token in error_message or token in str(error_type) for token in RETRYABLE_ERRORS
-            )
+    def _with_retry(self, operation: Callable[[], Any]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except Exception as exc:
+                error_message = str(exc)
+                error_type = getattr(exc, "type", "") or getattr(exc, "code", "")
+                error_status = getattr(exc, "status", "") or getattr(exc, "status_code", "")
+                is_retryable = _is_retryable(error_message, error_type)
+
+                if self.debug:
+                    print("[ClaudeClient] API Error Details:")
+                    print(f"  Type: {error_type}")
+                    print(f"  Status: {error_status}")
+                    print(f"  Message: {error_message}")
+
+                if is_retryable and attempt < self.max_retries:
+                    # Jitter keeps clients that hit the same rate limit from retrying in lockstep.
+                    delay = self.retry_delay * (2 ** attempt) * (0.8 + 0.2 * random.random())
+                    print(
+                        f"[ClaudeClient] API error ({error_type}), retrying in {delay:.0f}ms... "
+                        f"(attempt {attempt + 1}/{self.max_retries})"
+                    )
+                    time.sleep(delay / 1000)
+                    attempt += 1
+                    continue
 
-            if self.debug:
-                print("[ClaudeClient] API Error Details:")
-                print(f"  Type: {error_type}")
-                print(f"  Status: {error_status}")
-                print(f"  Message: {error_message}")
-
-            if is_retryable and retry_count < self.max_retries:
-                delay = self.retry_delay * (2 ** retry_count)
-                print(
-                    f"[ClaudeClient] API error ({error_type}), retrying in {delay}ms... "
-                    f"(attempt {retry_count + 1}/{self.max_retries})"
-                )
-                time.sleep(delay / 1000)
-                return self._with_retry(operation, retry_count + 1)
-
-            print(f"[ClaudeClient] API request failed: {error_message}")
-            if error_status == 401:
-                print("[ClaudeClient] Authentication failed - check your API key")
-            elif error_status == 403:
-                print("[ClaudeClient] Access denied - check API key permissions")
-            elif error_status == 400:
-                print("[ClaudeClient] Bad request - check your request parameters")
-            raise
-
-    def _calculate_cost(
-        self,
-        input_tokens: int,
-        output_tokens: int,
-        cache_read_tokens: int = 0,
-        cache_creation_tokens: int = 0,
-        thinking_tokens: int = 0,
-    ) -> float:
-        return model_config.calculate_cost(
-            self.model,
-            input_tokens,
-            output_tokens,
-            cache_read_tokens,
-            cache_creation_tokens,
-            thinking_tokens,
-        )
+                print(f"[ClaudeClient] API request failed: {error_message}")
+                if error_status == 401:
+                    print("[ClaudeClient] Authentication failed - check your API key")
+                elif error_status == 403:
+                    print("[ClaudeClient] Access denied - check API key permissions")
+                elif error_status == 400:
+                    print("[ClaudeClient] Bad request - check your request parameters")
+                raise
 
     def _update_usage(
         self,
@@ -625,7 +1015,13 @@ class ClaudeClient:
         cache_creation_tokens: int = 0,
         thinking_tokens: int = 0,
         api_duration_ms: int = 0,
+        cached: bool = False,
     ) -> None:
+        if cached:
+            # Replayed from the response cache: nothing was sent, so nothing is billed.
+            self.total_usage.response_cache_hits += 1
+            self.total_usage.response_cache_tokens += input_tokens + output_tokens
+            return
         self.total_usage.input_tokens += input_tokens
         self.total_usage.output_tokens += output_tokens
         self.total_usage.total_tokens += input_tokens + output_tokens
@@ -633,34 +1029,36 @@ class ClaudeClient:
         self.total_usage.cache_creation_tokens += cache_creation_tokens
         self.total_usage.thinking_tokens += thinking_tokens
         self.total_usage.api_duration_ms += api_duration_ms
-        self.total_usage.estimated_cost += self._calculate_cost(
+        resolved_model, cost = model_config.resolve_and_cost(
+            self.model,
             input_tokens,
             output_tokens,
             cache_read_tokens,
             cache_creation_tokens,
             thinking_tokens,
         )
+        self.total_usage.estimated_cost += cost
 
         model_stats.record(
-            self.model,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            cache_read_tokens=cache_read_tokens,
-            cache_creation_tokens=cache_creation_tokens,
-            thinking_tokens=thinking_tokens,
-            api_duration_ms=api_duration_ms,
+            resolved_model,
+            input_tokens,
+            output_tokens,
+            cache_read_tokens,
+            cache_creation_tokens,
+            thinking_tokens,
+            api_duration_ms,
+            cost=cost,
         )
 
     def _build_metadata(self) -> Dict[str, str]:
-        return {"user_id": f"user_{_get_user_id()}_account__session_{_get_session_id()}"}
+        # The user and session ids are process-wide, so the dict is built once and shared.
+        global _METADATA_CACHE
+        if _METADATA_CACHE is None:
+            _METADATA_CACHE = {"user_id": _get_user_id_string()}
+        return _METADATA_CACHE
 
     def _build_betas(self, is_oauth: bool) -> List[str]:
-        betas: List[str] = []
-        if is_oauth:
-            betas.append(CLAUDE_CODE_BETA)
-            betas.append(OAUTH_BETA)
-        betas.append(THINKING_BETA)
-        return betas
+        return _BETAS_OAUTH if is_oauth else _BETAS_APIKEY
 
     def create_message(
         self,
@@ -670,47 +1068,38 @@ class ClaudeClient:
         enable_thinking: bool = False,
         thinking_budget: Optional[int] = None,
     ) -> Dict[str, Any]:
-        start_time = time.time()
+        start_ns = time.monotonic_ns()
         capabilities = model_config.get_capabilities(self.model)
         thinking_params = self._thinking_manager.get_thinking_params(self.model, capabilities) if enable_thinking else {}
         if thinking_budget and "thinking" in thinking_params:
             thinking_params["thinking"]["budget_tokens"] = thinking_budget
 
-        def execute_request(model: str) -> Any:
-            betas = self._build_betas(self._is_oauth)
-            formatted_system = format_system_prompt(system_prompt, self._is_oauth)
-
-            request_params: Dict[str, Any] = {
-                "model": model,
-                "max_tokens": self.max_tokens,
-                "system": formatted_system,
-                "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
-                "metadata": self._build_metadata(),
-                **thinking_params,
-            }
-            if tools:
-                request_params["tools"] = [
-                    {
-                        "name": t["name"],
-                        "description": t.get("description"),
-                        "input_schema": t.get("input_schema") or t.get("inputSchema"),
-                    }
-                    for t in tools
-                ]
-            if betas:
-                request_params["betas"] = betas
+        # Everything except the model is the same for every retry and fallback attempt.
+        betas = self._build_betas(self._is_oauth)
+        formatted_system = format_system_prompt(system_prompt, self._is_oauth)
+
+        base_params: Dict[str, Any] = {
+            "max_tokens": self.max_tokens,
+            "system": formatted_system,
+            "messages": _prepare_messages(messages),
+            "metadata": self._build_metadata(),
+            **thinking_params,
+        }
+        if tools:
+            base_params["tools"] = _prepare_tools(tools)
+        if betas:
+            base_params["betas"] = betas
 
+        def execute_request(model: str) -> Any:
             if self.debug:
                 print("[ClaudeClient] Using beta.messages.create with betas:", betas)
                 print("[ClaudeClient] System prompt format:", "array" if isinstance(formatted_system, list) else "string")
 
-            return self._with_retry(lambda: self.client.beta.messages.create(request_params))
+            return self._with_retry(lambda: self.client.beta.messages.create(model=model, **base_params))
 
         if self.fallback_model:
             result = self._model_fallback.execute_with_fallback(
                 execute_request,
-                on_retry=lambda model, attempt, exc: self.debug
-                and print(f"[ClaudeClient] Retry {attempt} for {model}: {exc}"),
                 on_fallback=lambda from_model, to_model, exc: print(
                     f"[ClaudeClient] Falling back from {from_model} to {to_model}: {exc}"
                 ),
@@ -721,13 +1110,22 @@ class ClaudeClient:
             response = execute_request(self.model)
             used_model = self.model
 
-        api_duration_ms = int((time.time() - start_time) * 1000)
+        api_duration_ms = (time.monotonic_ns() - start_ns) // 1_000_000
         usage = getattr(response, "usage", None) or {}
-        input_tokens = getattr(usage, "input_tokens", usage.get("input_tokens", 0))
-        output_tokens = getattr(usage, "output_tokens", usage.get("output_tokens", 0))
-        cache_read_tokens = getattr(usage, "cache_read_input_tokens", usage.get("cache_read_input_tokens", 0))
-        cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", usage.get("cache_creation_input_tokens", 0))
-        thinking_tokens = getattr(usage, "thinking_tokens", 0) or getattr(response, "thinking_tokens", 0)
+        # SDK usage objects leave unreported counts as None, hence the trailing ``or 0``.
+        if isinstance(usage, dict):
+            input_tokens = usage.get("input_tokens") or 0
+            output_tokens = usage.get("output_tokens") or 0
+            cache_read_tokens = usage.get("cache_read_input_tokens") or 0
+            cache_creation_tokens = usage.get("cache_creation_input_tokens") or 0
+            thinking_tokens = usage.get("thinking_tokens") or 0
+        else:
+            input_tokens = getattr(usage, "input_tokens", None) or 0
+            output_tokens = getattr(usage, "output_tokens", None) or 0
+            cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+            cache_creation_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+            thinking_tokens = getattr(usage, "thinking_tokens", None) or 0
+        thinking_tokens = thinking_tokens or getattr(response, "thinking_tokens", 0)
 
         thinking_result = None
         thinking_content = getattr(response, "thinking", None)
@@ -735,7 +1133,7 @@ class ClaudeClient:
             thinking_result = self._thinking_manager.process_thinking_response(
                 thinking_content,
                 thinking_tokens,
-                start_time,
+                start_ns,
             )
 
         self._update_usage(
@@ -769,7 +1167,85 @@ class ClaudeClient:
         enable_thinking: bool = False,
         thinking_budget: Optional[int] = None,
         callbacks: Optional[StreamCallbacks] = None,
+        reuse_events: bool = False,
     ) -> Iterable[Dict[str, Any]]:
+        """Stream a response as event dicts.
+
+        With ``reuse_events=True`` the text, thinking and tool events are the same
+        dict objects updated in place on every yield, so consumers must read or copy
+        each event before advancing the iterator.
+        """
+        request_params, state = self._prepare_stream(
+            messages, tools, system_prompt, enable_thinking, thinking_budget, callbacks
+        )
+        if reuse_events:
+            state.text_event = {"type": EVENT_TEXT, "text": ""}
+            state.thinking_event = {"type": EVENT_THINKING, "thinking": ""}
+            state.tool_delta_event = {"type": EVENT_TOOL_USE_DELTA, "input": ""}
+            state.tool_start_event = {"type": EVENT_TOOL_USE_START, "id": "", "name": ""}
+
+        cached = self._lookup_stream_cache(request_params, state)
+
+        try:
+            if cached is not None:
+                yield from self._replay_cached_stream(cached, state)
+            else:
+                with self.client.beta.messages.stream(**request_params) as stream:
+                    yield from self._iter_stream_events(stream, state)
+            if callbacks and callbacks.on_complete:
+                callbacks.on_complete()
+        except Exception as exc:
+            if callbacks and callbacks.on_error:
+                callbacks.on_error(exc)
+            yield {"type": EVENT_ERROR, "error": str(exc)}
+
+    def run_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        system_prompt: Optional[str] = None,
+        enable_thinking: bool = False,
+        thinking_budget: Optional[int] = None,
+        callbacks: Optional[StreamCallbacks] = None,
+    ) -> None:
+        """Stream a response through ``callbacks`` only.
+
+        Unlike create_message_stream this is a plain function, not a generator, so
+        callers that only forward callbacks skip the per-event generator round trip.
+        Errors go to ``callbacks.on_error`` when set and are raised otherwise.
+        """
+        request_params, state = self._prepare_stream(
+            messages, tools, system_prompt, enable_thinking, thinking_budget, callbacks
+        )
+        cached = self._lookup_stream_cache(request_params, state)
+
+        try:
+            if cached is not None:
+                for _ in self._replay_cached_stream(cached, state):
+                    pass
+            else:
+                with self.client.beta.messages.stream(**request_params) as stream:
+                    for event in stream:
+                        _step_stream_event(event, state)
+                    _flush_stream_tail(state)
+                    if state.stopped:
+                        self._finish_stream(stream, state)
+            if callbacks and callbacks.on_complete:
+                callbacks.on_complete()
+        except Exception as exc:
+            if not (callbacks and callbacks.on_error):
+                raise
+            callbacks.on_error(exc)
+
+    def _prepare_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        system_prompt: Optional[str],
+        enable_thinking: bool,
+        thinking_budget: Optional[int],
+        callbacks: Optional[StreamCallbacks],
+    ) -> Tuple[Dict[str, Any], _StreamState]:
         capabilities = model_config.get_capabilities(self.model)
         thinking_params = self._thinking_manager.get_thinking_params(self.model, capabilities) if enable_thinking else {}
         if thinking_budget and "thinking" in thinking_params:
@@ -782,19 +1258,12 @@ class ClaudeClient:
             "model": self.model,
             "max_tokens": self.max_tokens,
             "system": formatted_system,
-            "messages": [{"role": m["role"], "content": m["content"]} for m in messages],
+            "messages": _prepare_messages(messages),
             "metadata": self._build_metadata(),
             **thinking_params,
         }
         if tools:
-            request_params["tools"] = [
-                {
-                    "name": t["name"],
-                    "description": t.get("description"),
-                    "input_schema": t.get("input_schema") or t.get("inputSchema"),
-                }
-                for t in tools
-            ]
+            request_params["tools"] = _prepare_tools(tools)
         if betas:
             request_params["betas"] = betas
 
@@ -802,85 +1271,121 @@ class ClaudeClient:
             print("[ClaudeClient] Using beta.messages.stream with betas:", betas)
             print("[ClaudeClient] System prompt format:", "array" if isinstance(formatted_system, list) else "string")
 
-        input_tokens = 0
-        output_tokens = 0
-        cache_read_tokens = 0
-        cache_creation_tokens = 0
-        thinking_tokens = 0
+        state = _StreamState(
+            on_text=callbacks.on_text if callbacks else None,
+            on_tool_use=callbacks.on_tool_use if callbacks else None,
+            batch_seconds=self.text_batch_ms / 1000,
+            batch_chars=self.text_batch_chars,
+        )
+        return request_params, state
+
+    def _lookup_stream_cache(
+        self, request_params: Dict[str, Any], state: _StreamState
+    ) -> Optional[Tuple[Tuple[Dict[str, Any], ...], Dict[str, int]]]:
+        """Return the cached response for ``request_params``; on a miss, set ``state`` up to record one."""
+        cache = self.response_cache
+        if cache is None:
+            return None
+        key = cache.key_for(request_params)
+        cached = cache.get(key)
+        if cached is None:
+            state.cache_key = key
+            state.recorded = []
+        return cached
+
+    def _replay_cached_stream(
+        self,
+        cached: Tuple[Tuple[Dict[str, Any], ...], Dict[str, int]],
+        state: _StreamState,
+    ) -> Iterator[Dict[str, Any]]:
+        events, usage = cached
+        for event in events:
+            if event["type"] == EVENT_TEXT and state.on_text:
+                state.on_text(event["text"])
+            elif event["type"] == EVENT_TOOL_USE_START and state.on_tool_use:
+                state.on_tool_use(event["id"], event["name"], {})
+            yield dict(event)
+        self._update_usage(usage["input_tokens"], usage["output_tokens"], cached=True)
+        yield {"type": EVENT_USAGE, "usage": dict(usage)}
+        yield {"type": EVENT_STOP}
+
+    def _iter_stream_events(self, stream: Any, state: _StreamState) -> Iterator[Dict[str, Any]]:
+        # Kept free of try/except; create_message_stream owns error handling for the whole stream.
+        for event in stream:
+            flushed, out = _step_stream_event(event, state)
+            if flushed is not None:
+                yield flushed
+            if out is not None:
+                yield out
+        flushed = _flush_stream_tail(state)
+        if flushed is not None:
+            yield flushed
+
+        if state.stopped:
+            yield {"type": EVENT_USAGE, "usage": self._finish_stream(stream, state)}
+            yield {"type": EVENT_STOP}
+
+    def _finish_stream(self, stream: Any, state: _StreamState) -> Dict[str, int]:
+        """Settle token counts after message_stop, record them, and return the usage payload.
+
+        A stream that missed the response cache is stored in it here.
+        """
+        if state.reported_thinking_tokens is not None:
+            state.thinking_tokens = state.reported_thinking_tokens
+        elif state.saw_thinking:
+            # Only consult the accumulated message when thinking streamed but no usage event counted it.
+            final_message = stream.get_final_message()
+            if final_message and final_message.usage:
+                state.thinking_tokens = getattr(final_message.usage, "thinking_tokens", 0) or 0
+        if not state.output_tokens:
+            state.output_tokens = state.streamed_chars // 4
 
-        try:
-            with self.client.beta.messages.stream(request_params) as stream:
-                for event in stream:
-                    if event.type == "content_block_delta":
-                        delta = event.delta
-                        if delta.type == "text_delta":
-                            if callbacks and callbacks.on_text:
-                                callbacks.on_text(delta.text)
-                            yield {"type": "text", "text": delta.text}
-                        elif delta.type == "thinking_delta":
-                            yield {"type": "thinking", "thinking": delta.thinking}
-                        elif delta.type == "input_json_delta":
-                            yield {"type": "tool_use_delta", "input": delta.partial_json}
-                    elif event.type == "content_block_start":
-                        block = event.content_block
-                        if block.type == "tool_use":
-                            if callbacks and callbacks.on_tool_use:
-                                callbacks.on_tool_use(block.id, block.name, block.input)
-                            yield {"type": "tool_use_start", "id": block.id, "name": block.name}
-                    elif event.type == "message_delta":
-                        if event.usage:
-                            output_tokens = getattr(event.usage, "output_tokens", output_tokens)
-                    elif event.type == "message_start":
-                        msg = event.message
-                        if msg and msg.usage:
-                            input_tokens = getattr(msg.usage, "input_tokens", input_tokens)
-                            cache_read_tokens = getattr(msg.usage, "cache_read_input_tokens", cache_read_tokens)
-                            cache_creation_tokens = getattr(msg.usage, "cache_creation_input_tokens", cache_creation_tokens)
-                    elif event.type == "message_stop":
-                        final_message = stream.get_final_message()
-                        if final_message and final_message.usage:
-                            thinking_tokens = getattr(final_message.usage, "thinking_tokens", 0)
-
-                        self._update_usage(
-                            input_tokens,
-                            output_tokens,
-                            cache_read_tokens,
-                            cache_creation_tokens,
-                            thinking_tokens,
-                        )
-                        yield {
-                            "type": "usage",
-                            "usage": {
-                                "input_tokens": input_tokens,
-                                "output_tokens": output_tokens,
-                                "cache_read_tokens": cache_read_tokens,
-                                "cache_creation_tokens": cache_creation_tokens,
-                                "thinking_tokens": thinking_tokens,
-                            },
-                        }
-                        yield {"type": "stop"}
-                if callbacks and callbacks.on_complete:
-                    callbacks.on_complete()
-        except Exception as exc:
-            if callbacks and callbacks.on_error:
-                callbacks.on_error(exc)
-            yield {"type": "error", "error": str(exc)}
+        self._update_usage(
+            state.input_tokens,
+            state.output_tokens,
+            state.cache_read_tokens,
+            state.cache_creation_tokens,
+            state.thinking_tokens,
+        )
+        usage = {
+            "input_tokens": state.input_tokens,
+            "output_tokens": state.output_tokens,
+            "cache_read_tokens": state.cache_read_tokens,
+            "cache_creation_tokens": state.cache_creation_tokens,
+            "thinking_tokens": state.thinking_tokens,
+        }
+        cache = self.response_cache
+        if cache is not None and state.recorded is not None and state.cache_key is not None:
+            cache.put(state.cache_key, tuple(state.recorded), dict(usage))
+        return usage
 
     def get_usage_stats(self) -> UsageStats:
-        return UsageStats(**self.total_usage.__dict__)
+        return replace(self.total_usage)
 
     def get_formatted_cost(self) -> str:
-        if self.total_usage.estimated_cost < 0.01:
-            return f"${self.total_usage.estimated_cost * 100:.2f}¢"
-        return f"${self.total_usage.estimated_cost:.4f}"
+        cost = self.total_usage.estimated_cost
+        cached_cost, formatted = self._cost_cache
+        if cost == cached_cost:
+            return formatted
+        if cost < 0.01:
+            formatted = f"${cost * 100:.2f}¢"
+        else:
+            formatted = f"${cost:.4f}"
+        self._cost_cache = (cost, formatted)
+        return formatted
 
     def reset_usage_stats(self) -> None:
-        self.total_usage = UsageStats(
-            input_tokens=0,
-            output_tokens=0,
-            total_tokens=0,
-            estimated_cost=0.0,
-        )
+        usage = self.total_usage
+        usage.input_tokens = 0
+        usage.output_tokens = 0
+        usage.total_tokens = 0
+        usage.estimated_cost = 0.0
+        usage.cache_read_tokens = 0
+        usage.cache_creation_tokens = 0
+        usage.thinking_tokens = 0
+        usage.api_duration_ms = 0
+        usage.response_cache_hits = 0
+        usage.response_cache_tokens = 0
 
     def set_model(self, model: str) -> None:
         self.model = model_config.resolve_alias(model)
@@ -903,7 +1408,15 @@ __all__ = [
     "ThinkingConfig",
     "ThinkingResult",
     "ModelUsageStats",
+    "ResponseCache",
     "model_stats",
     "has_valid_identity",
     "format_system_prompt",
+    "EVENT_TEXT",
+    "EVENT_THINKING",
+    "EVENT_TOOL_USE_START",
+    "EVENT_TOOL_USE_DELTA",
+    "EVENT_USAGE",
+    "EVENT_STOP",
+    "EVENT_ERROR",
 ]